@@ -14,10 +14,16 @@ import time
 import base64
 import yaml
 import logging
+import logging.handlers
+import queue
+import copy
+import atexit
 import tempfile
 import random
 import schedule
 import json
+import threading
+import signal
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
 
@@ -41,6 +47,77 @@ try:
 except Exception:
     HAS_DB = False
 
+from gobernador import GobernadorPeticiones
+from supervisor_chrome import SupervisorChrome, HAS_PSUTIL
+from perfilador import PerfiladorMuestreo
+from webdriver_remoto import BalanceadorRemoto
+from grabador_captcha import GrabadorCaptcha
+from contadores import ContadoresVentana
+
+# -------------------- Logging (cola + escritor en segundo plano) --------------------
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro, con cuenta/etapa/intento cuando vienen en `extra`"""
+    CAMPOS = ("cuenta", "etapa", "intento")
+
+    def format(self, record):
+        d = {"ts": self.formatTime(record), "nivel": record.levelname, "hilo": record.threadName, "msg": record.getMessage()}
+        for campo in self.CAMPOS:
+            valor = getattr(record, campo, None)
+            if valor is not None:
+                d[campo] = valor
+        if record.exc_info:
+            d["exc"] = self.formatException(record.exc_info)
+        return json.dumps(d, ensure_ascii=False)
+
+
+class ColaLogs(logging.handlers.QueueHandler):
+    """
+    QueueHandler que no aplana la excepción dentro de msg (prepare() por defecto lo hace):
+    el registro se resuelve aquí (msg ya con sus args) pero conserva exc_info, y el
+    formateador de cada destino decide cómo pintarla (en JSON va en el campo `exc`).
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class FiltroRepetidos(logging.Filter):
+    """Deja pasar un mismo WARNING/ERROR (misma plantilla y cuenta) como mucho una vez por ventana"""
+    def __init__(self, ventana_s=60):
+        super().__init__()
+        self.ventana_s = float(ventana_s)
+        self._vistos = {}
+        self._lock = threading.Lock()
+        self._ultima_poda = time.monotonic()
+
+    def _podar(self, ahora):
+        """Olvida las claves que llevan más de una ventana sin repetirse (con self._lock tomado)"""
+        self._ultima_poda = ahora
+        for clave in [c for c, (ultimo, _) in self._vistos.items() if ahora - ultimo >= self.ventana_s]:
+            del self._vistos[clave]
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING or self.ventana_s <= 0:
+            return True
+        clave = (record.levelno, record.msg, getattr(record, "cuenta", None))
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora - self._ultima_poda >= self.ventana_s:
+                self._podar(ahora)
+            ultimo, suprimidos = self._vistos.get(clave, (0.0, 0))
+            if ahora - ultimo < self.ventana_s:
+                self._vistos[clave] = (ultimo, suprimidos + 1)
+                return False
+            self._vistos[clave] = (ahora, 0)
+        if suprimidos:
+            record.msg = f"{record.msg} (+{suprimidos} similares suprimidos)"
+        return True
+
+
+URL_CONSULTA = "https://sutramiteconsular.maec.es/"
+
 # -------------------- Config CRNN (dimensiones esperadas) --------------------
 IMG_HEIGHT = 50
 IMG_WIDTH = 200
@@ -111,6 +188,9 @@ class CRNNPredictor:
         img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
         if img is None:
             raise ValueError("No se pudo cargar imagen para CRNN")
+        return self._to_tensor(img)
+
+    def _to_tensor(self, img):
         img = cv2.resize(img, (IMG_WIDTH, IMG_HEIGHT))
         img = img.astype(np.float32) / 255.0
         arr = np.expand_dims(img, axis=0)
@@ -150,32 +230,50 @@ class CRNNPredictor:
         decodeds, confs = self.ctc_decode(log_probs)
         return decodeds[0], confs[0]
 
+    def predict_bytes(self, data):
+        """Igual que predict() pero desde los bytes PNG en memoria (sin archivo temporal)"""
+        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError("No se pudo decodificar imagen para CRNN")
+        with torch.no_grad():
+            log_probs = self.model(self._to_tensor(img))
+        decodeds, confs = self.ctc_decode(log_probs)
+        return decodeds[0], confs[0]
+
 # -------------------- Bot principal --------------------
 class BotVisado:
     DEFAULT_MAX_CONCURRENCY = 4
     DEFAULT_SUMMARY_HOURS = 12
 
     def __init__(self, config_path="config.yaml"):
+        self.config_path = config_path
         self.config = self._cargar_config(config_path)
+        self._config_mtime = os.path.getmtime(config_path)
+        self._recarga_pendiente = False
         self._setup_logging()
         self._cargar_db()
         self._cargar_crnn()
+        self._cargar_gobernador()
+        self._cargar_supervisor()
+        self._cargar_perfilador()
+        self._cargar_backend_selenium()
+        self._cargar_grabador()
         self.cuentas = self.config.get('cuentas', [])
         if not self.cuentas:
             self.logger.error("No hay cuentas configuradas en config.yaml")
             raise ValueError("No hay cuentas configuradas")
-        self.MAX_CONCURRENCIA = int(self.config.get('max_concurrency', self.DEFAULT_MAX_CONCURRENCY))
+        self._leer_parametros(self.config)
         self.executor = ThreadPoolExecutor(max_workers=self.MAX_CONCURRENCIA)
-        self.MAX_REINTENTOS = int(self.config.get('max_reintentos', 12))
-        # scheduling params
-        self.interval_hours = float(self.config.get('monitor_interval_hours', 0.5))  # por defecto 30 minutos
-        self.summary_hours = float(self.config.get('summary_hours', self.DEFAULT_SUMMARY_HOURS))
+        self._lock_metricas = threading.Lock()
+        self.metricas_sesion = self._metricas_sesion_vacias()
+        self._job_monitoreo = self._job_resumen = None
+        self._cargar_contadores()
         self.resend_api_key = os.environ.get('RESEND_API_KEY')
         # Estado interno
         self.running = False
         # Para rastrear primeras verificaciones
         self.primeras_verificaciones = self._cargar_primeras_verificaciones()
-        self.logger.info(f"Bot inicializado: {len(self.cuentas)} cuentas, concurrencia={self.MAX_CONCURRENCIA}, intervalo={self.interval_hours}h, resumen cada {self.summary_hours}h")
+        self.logger.info(f"Bot inicializado: {len(self.cuentas)} cuentas, concurrencia={self.MAX_CONCURRENCIA}, cuentas/sesión={self.cuentas_por_sesion}, intervalo={self.interval_hours}h, resumen cada {self.summary_hours}h")
 
     def _cargar_config(self, path):
         if not os.path.exists(path):
@@ -183,44 +281,239 @@ class BotVisado:
         with open(path, 'r', encoding='utf-8') as f:
             return yaml.safe_load(f)
 
+    def _parsear_parametros(self, config):
+        """Valida los parámetros baratos de aplicar; lanza ValueError/TypeError si alguno no es válido"""
+        if not isinstance(config, dict):
+            raise ValueError("el nivel superior de la config debe ser un mapa")
+        cuentas = config.get('cuentas')
+        if not isinstance(cuentas, list) or not cuentas:
+            raise ValueError("no hay cuentas configuradas")
+        for c in cuentas:
+            if not isinstance(c, dict) or not c.get('identificador'):
+                raise ValueError(f"cuenta inválida (se espera un mapa con 'identificador'): {c!r}")
+        for seccion in ('postgres', 'crnn', 'gobernador', 'selenium', 'grabador_captcha', 'notificaciones'):
+            if not isinstance(config.get(seccion) or {}, dict):
+                raise ValueError(f"la sección '{seccion}' debe ser un mapa")
+        float((config.get('crnn') or {}).get('conf_threshold', 0.5))
+        p = {
+            "MAX_CONCURRENCIA": int(config.get('max_concurrency', self.DEFAULT_MAX_CONCURRENCY)),
+            "MAX_REINTENTOS": int(config.get('max_reintentos', 12)),
+            # Cuántas cuentas se consultan seguidas reutilizando la misma sesión de Chrome (1 = sesión por cuenta)
+            "cuentas_por_sesion": max(1, int(config.get('cuentas_por_sesion', 1))),
+            # scheduling params
+            "interval_hours": float(config.get('intervalo_horas', config.get('monitor_interval_hours', 0.5))),  # por defecto 30 minutos
+            "summary_hours": float(config.get('resumen_interval_hours', config.get('summary_hours', self.DEFAULT_SUMMARY_HOURS))),
+        }
+        if p["MAX_CONCURRENCIA"] < 1 or p["MAX_REINTENTOS"] < 1:
+            raise ValueError("max_concurrency y max_reintentos deben ser >= 1")
+        if p["interval_hours"] <= 0 or p["summary_hours"] <= 0:
+            raise ValueError("los intervalos deben ser > 0")
+        return p
+
+    def _leer_parametros(self, config):
+        """Parámetros baratos de aplicar (se releen también en cada recarga en caliente)"""
+        for nombre, valor in self._parsear_parametros(config).items():
+            setattr(self, nombre, valor)
+
     def _setup_logging(self):
-        logging.basicConfig(level=logging.INFO,
-            format="%(asctime)s - %(levelname)s - %(message)s",
-            handlers=[logging.StreamHandler(), logging.FileHandler("bot_visado.log", encoding="utf-8")]
-        )
+        log_cfg = self.config.get('logging', {}) or {}
+        if log_cfg.get('formato', 'texto') == 'json':
+            formato = FormatoJSON()
+        else:
+            formato = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+        archivo = log_cfg.get('archivo', "bot_visado.log")
+        if log_cfg.get('rotacion', 'tamano') == 'diaria':
+            fichero = logging.handlers.TimedRotatingFileHandler(archivo, when="midnight", backupCount=int(log_cfg.get('copias', 7)), encoding="utf-8")
+        else:
+            fichero = logging.handlers.RotatingFileHandler(archivo, maxBytes=int(float(log_cfg.get('max_mb', 10)) * 1024 * 1024), backupCount=int(log_cfg.get('copias', 5)), encoding="utf-8")
+        destinos = [logging.StreamHandler(), fichero]
+        for h in destinos:
+            h.setFormatter(formato)
+
+        # Los workers solo encolan; un único hilo escribe en consola y archivo
+        cola = ColaLogs(queue.Queue(-1))
+        cola.addFilter(FiltroRepetidos(log_cfg.get('limite_repetidos_s', 60)))
+        self._log_listener = logging.handlers.QueueListener(cola.queue, *destinos, respect_handler_level=True)
+        self._log_listener.start()
+        atexit.register(self._log_listener.stop)
+
+        root = logging.getLogger()
+        for h in list(root.handlers):
+            root.removeHandler(h)
+        root.addHandler(cola)
+        root.setLevel(getattr(logging, str(log_cfg.get('nivel', 'INFO')).upper(), logging.INFO))
         self.logger = logging.getLogger("BotVisado")
 
+    # Los _crear_* construyen el recurso a partir de una config sin tocar el estado del bot,
+    # así la recarga en caliente puede prepararlo todo antes de aplicarlo. Con estricto=True
+    # (recarga) un fallo en una sección habilitada lanza en vez de devolver None, para no
+    # sustituir un recurso que funciona por el modo degradado.
     def _cargar_db(self):
-        self.db = None
-        db_conf = self.config.get('postgres', {})
+        self.db = self._crear_db(self.config)
+
+    def _crear_db(self, config, estricto=False):
+        db_conf = config.get('postgres', {}) or {}
         if db_conf.get('enabled', False) and HAS_DB:
             try:
                 # DatabaseManager expects env DATABASE_URL configured by Railway
-                self.db = DatabaseManager()
+                db = DatabaseManager()
                 self.logger.info("Conexión a PostgreSQL (Railway) establecida.")
+                return db
             except Exception as e:
+                if estricto:
+                    raise
                 self.logger.error(f"No se pudo inicializar la base de datos: {e}")
-                self.db = None
+                return None
         else:
             if not HAS_DB:
+                if estricto and db_conf.get('enabled', False):
+                    raise RuntimeError("postgres habilitado pero DatabaseManager no está disponible")
                 self.logger.warning("DatabaseManager no está disponible; operando sin DB (se usarán archivos locales).")
             else:
                 self.logger.info("Postgres deshabilitado por config.")
+            return None
 
     def _cargar_crnn(self):
-        crnn_cfg = self.config.get('crnn', {})
+        self.crnn = self._crear_crnn(self.config)
+
+    def _crear_crnn(self, config, estricto=False):
+        crnn_cfg = config.get('crnn', {}) or {}
         model_path = crnn_cfg.get('model_path')
         mapping_path = crnn_cfg.get('mapping_path')
         if model_path and mapping_path and os.path.exists(model_path) and os.path.exists(mapping_path):
             try:
                 device = crnn_cfg.get('device', None)
-                self.crnn = CRNNPredictor(model_path, mapping_path, device=device)
+                return CRNNPredictor(model_path, mapping_path, device=device)
             except Exception as e:
-                self.crnn = None
+                if estricto:
+                    raise
                 self.logger.error(f"No se pudo cargar CRNN: {e}")
+                return None
         else:
-            self.crnn = None
+            if estricto and (model_path or mapping_path):
+                raise FileNotFoundError(f"modelo CRNN no encontrado: {model_path} / {mapping_path}")
             self.logger.warning("No hay modelo CRNN disponible; se usará Tesseract como fallback.")
+            return None
+
+    def _cargar_gobernador(self):
+        self.gobernador = self._crear_gobernador(self.config, self.db)
+
+    def _crear_gobernador(self, config, db, estricto=False):
+        gob_cfg = config.get('gobernador', {}) or {}
+        if not gob_cfg.get('enabled', True):
+            self.logger.info("Gobernador de peticiones deshabilitado por config.")
+            return None
+        db_cupos = None
+        if db and gob_cfg.get('compartido_db', True):
+            # conexión propia: sus commits/rollbacks no se mezclan con los del historial
+            try:
+                db_cupos = DatabaseManager()
+            except Exception as e:
+                if estricto:
+                    raise
+                self.logger.warning(f"Gobernador sin cupo compartido entre réplicas: {e}")
+        return GobernadorPeticiones(
+            tasa_inicial=gob_cfg.get('tasa_inicial', 2.0),
+            tasa_min=gob_cfg.get('tasa_min', 0.2),
+            tasa_max=gob_cfg.get('tasa_max', 4.0),
+            rafaga=gob_cfg.get('rafaga', 4),
+            ventana=gob_cfg.get('ventana', 20),
+            umbral_error=gob_cfg.get('umbral_error', 0.3),
+            margen_rechazo=gob_cfg.get('margen_rechazo', 0.25),
+            db=db_cupos,
+        )
+
+    def _cargar_supervisor(self):
+        sup_cfg = self.config.get('supervisor_chrome', {}) or {}
+        self.supervisor = None
+        if not sup_cfg.get('enabled', True):
+            self.logger.info("Supervisor de procesos Chrome deshabilitado por config.")
+        elif not HAS_PSUTIL:
+            self.logger.warning("psutil no está disponible; sin supervisión de procesos Chrome.")
+        else:
+            self.supervisor = SupervisorChrome(
+                max_rss_mb=sup_cfg.get('max_rss_mb', 1500),
+                intervalo_s=sup_cfg.get('intervalo_s', 30),
+                gracia_quit_s=sup_cfg.get('gracia_quit_s', 5),
+            )
+
+    def _cargar_backend_selenium(self):
+        self.remotos = self._crear_backend_selenium(self.config)
+
+    def _crear_backend_selenium(self, config, estricto=False):
+        sel_cfg = config.get('selenium', {}) or {}
+        remotos = None
+        if sel_cfg.get('backend', 'local') == 'remoto':
+            try:
+                remotos = BalanceadorRemoto(
+                    sel_cfg.get('remotos', []),
+                    max_sesiones_por_nodo=sel_cfg.get('max_sesiones_por_nodo', 4),
+                    intervalo_salud_s=sel_cfg.get('intervalo_salud_s', 30),
+                    espera_hueco_s=sel_cfg.get('espera_hueco_s', 300),
+                )
+                self.logger.info(f"Backend WebDriver remoto: {len(sel_cfg.get('remotos', []))} endpoints")
+            except Exception as e:
+                if estricto:
+                    raise
+                self.logger.error(f"No se pudo configurar el backend remoto; se usará Chrome local: {e}")
+        return remotos
+
+    def _cargar_grabador(self):
+        self.grabador = self._crear_grabador(self.config)
+
+    def _crear_grabador(self, config, estricto=False):
+        grab_cfg = config.get('grabador_captcha', {}) or {}
+        if grab_cfg.get('enabled', False):
+            try:
+                grabador = GrabadorCaptcha(grab_cfg.get('directorio', "corpus_captcha"), grab_cfg.get('max_shard_mb', 64))
+                self.logger.info(f"Grabador de CAPTCHA activo en {grabador.directorio}")
+                return grabador
+            except Exception as e:
+                if estricto:
+                    raise
+                self.logger.error(f"No se pudo iniciar el grabador de CAPTCHA: {e}")
+        return None
+
+    def _grabar_captcha(self, registro, veredicto):
+        """Graba el intento con el veredicto del servidor (una sola vez por intento)"""
+        if not self.grabador or not registro or "imagen" not in registro:
+            return
+        imagen = registro.pop("imagen")
+        self.grabador.grabar(imagen, veredicto=veredicto, **registro)
+
+    def _cargar_perfilador(self):
+        prof_cfg = self.config.get('perfilador', {}) or {}
+        self._ciclo = 0
+        self._perfiles_senal = 0
+        self.perfilador = PerfiladorMuestreo(
+            directorio=prof_cfg.get('directorio', "perfiles"),
+            hz=prof_cfg.get('hz', 50),
+        )
+        if int(prof_cfg.get('ciclos', 0)) > 0:
+            self.perfilador.solicitar(int(prof_cfg['ciclos']))
+        puerto = int(prof_cfg.get('puerto_http', 0))
+        if puerto:
+            try:
+                self.perfilador.servir_http(puerto)
+            except OSError as e:
+                self.logger.error(f"No se pudo abrir el disparador HTTP del perfilador en el puerto {puerto}: {e}")
+
+    def _solicitar_perfil(self, signum=None, frame=None):
+        """Handler de SIGUSR1: solo anota la petición (sin locks ni logging dentro del handler)"""
+        self._perfiles_senal += 1
+
+    def _aplicar_perfiles_pendientes(self):
+        n, self._perfiles_senal = self._perfiles_senal, 0
+        if n:
+            self.perfilador.solicitar(n)
+
+    def _gobernar(self, tipo, reintento=False):
+        if self.gobernador:
+            self.gobernador.adquirir(tipo, reintento)
+
+    def _reportar_sitio(self, ok, rechazo_captcha=False):
+        if self.gobernador:
+            self.gobernador.registrar_resultado(ok, rechazo_captcha)
 
     def _cargar_primeras_verificaciones(self):
         """Carga el historial de primeras verificaciones desde archivo"""
@@ -243,6 +536,120 @@ class BotVisado:
         except Exception as e:
             self.logger.warning(f"Error guardando primeras verificaciones: {e}")
 
+    # ------------------ Recarga de configuración en caliente ------------------
+    def _solicitar_recarga(self, signum=None, frame=None):
+        """Handler de SIGHUP: la recarga se aplica en el bucle principal, entre ciclos"""
+        self._recarga_pendiente = True
+
+    def _revisar_recarga_config(self):
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            return
+        if mtime != self._config_mtime or self._recarga_pendiente:
+            self._config_mtime = mtime
+            self._recarga_pendiente = False
+            try:
+                self.recargar_config()
+            except Exception as e:
+                # nunca tumbar el bot 24/7 por una recarga; se sigue con la config en uso
+                self.logger.error(f"Error aplicando la recarga de config; se mantiene la anterior: {e}")
+
+    def recargar_config(self):
+        """Relee config.yaml y aplica solo las diferencias con la configuración en uso"""
+        try:
+            nueva = self._cargar_config(self.config_path)
+            params = self._parsear_parametros(nueva)
+        except Exception as e:
+            self.logger.error(f"Recarga de config ignorada, {self.config_path} no es válido: {e}")
+            return
+        anterior = self.config
+        cambios = []
+
+        # 1) Preparar en locales todo lo que haya cambiado; si algo falla (también una sección
+        #    habilitada que no arranca) no se aplica nada y se conservan los recursos en uso
+        nuevos = {}
+        try:
+            # Recursos caros: solo si cambió su propia sección
+            if nueva.get('postgres') != anterior.get('postgres'):
+                nuevos['db'] = self._crear_db(nueva, estricto=True)
+                cambios.append("postgres")
+            crnn_ant, crnn_new = anterior.get('crnn') or {}, nueva.get('crnn') or {}
+            if any(crnn_ant.get(k) != crnn_new.get(k) for k in ('model_path', 'mapping_path', 'device')):
+                nuevos['crnn'] = self._crear_crnn(nueva, estricto=True)
+                cambios.append("modelo CRNN")
+            elif crnn_ant.get('conf_threshold') != crnn_new.get('conf_threshold'):
+                # resolver_captcha lee el umbral de self.config en cada llamada
+                cambios.append(f"crnn.conf_threshold={crnn_new.get('conf_threshold')}")
+            if nueva.get('grabador_captcha') != anterior.get('grabador_captcha'):
+                nuevos['grabador'] = self._crear_grabador(nueva, estricto=True)
+                cambios.append("grabador captcha")
+            if nueva.get('selenium') != anterior.get('selenium'):
+                nuevos['remotos'] = self._crear_backend_selenium(nueva, estricto=True)
+                cambios.append("backend selenium")
+            if nueva.get('gobernador') != anterior.get('gobernador') or 'db' in nuevos:
+                nuevos['gobernador'] = self._crear_gobernador(nueva, nuevos.get('db', self.db), estricto=True)
+                cambios.append("gobernador")
+            if params["MAX_CONCURRENCIA"] != self.MAX_CONCURRENCIA:
+                nuevos['executor'] = ThreadPoolExecutor(max_workers=params["MAX_CONCURRENCIA"])
+                cambios.append(f"concurrencia {self.MAX_CONCURRENCIA}->{params['MAX_CONCURRENCIA']}")
+        except Exception as e:
+            self.logger.error(f"Recarga de config ignorada, no se pudo preparar: {e}")
+            if nuevos.get('db'):
+                nuevos['db'].close()
+            if nuevos.get('gobernador'):
+                nuevos['gobernador'].cerrar()
+            if nuevos.get('executor'):
+                nuevos['executor'].shutdown(wait=False)
+            return
+
+        # Cuentas: diff por identificador
+        previas = {c.get('identificador'): c for c in self.cuentas}
+        actuales = {c.get('identificador'): c for c in nueva['cuentas']}
+        nuevas = [c for ident, c in actuales.items() if ident not in previas]
+        eliminadas = [ident for ident in previas if ident not in actuales]
+        modificadas = [ident for ident, c in actuales.items() if ident in previas and c != previas[ident]]
+        if nuevas:
+            cambios.append(f"{len(nuevas)} cuentas nuevas")
+        if eliminadas:
+            cambios.append(f"{len(eliminadas)} cuentas eliminadas")
+        if modificadas:
+            cambios.append(f"{len(modificadas)} cuentas modificadas")
+
+        # 2) Aplicar (sin operaciones que puedan fallar a medias)
+        intervalos_ant = (self.interval_hours, self.summary_hours)
+        self.config = nueva
+        self.cuentas = nueva['cuentas']
+        for nombre, valor in params.items():
+            setattr(self, nombre, valor)
+        if 'db' in nuevos:
+            viejo_db, self.db = self.db, nuevos['db']
+            if viejo_db:
+                try:
+                    viejo_db.close()
+                except Exception as e:
+                    self.logger.warning(f"Error cerrando la conexión anterior a PostgreSQL: {e}")
+        if 'gobernador' in nuevos and self.gobernador:
+            self.gobernador.cerrar()
+        for nombre in ('crnn', 'grabador', 'remotos', 'gobernador'):
+            if nombre in nuevos:
+                setattr(self, nombre, nuevos[nombre])
+        if 'executor' in nuevos:
+            # Las tareas en curso terminan en el executor anterior
+            viejo, self.executor = self.executor, nuevos['executor']
+            viejo.shutdown(wait=False)
+        self.contadores.retencion_horas = max(self.summary_hours, 24)
+        if (self.interval_hours, self.summary_hours) != intervalos_ant and self.running:
+            self._programar_tareas()
+            cambios.append(f"intervalo={self.interval_hours}h resumen={self.summary_hours}h")
+
+        self.logger.info(f"Config recargada: {', '.join(cambios) if cambios else 'sin cambios relevantes'}")
+        # Solo las cuentas nuevas se consultan ya; el resto sigue su calendario
+        if nuevas and self.running:
+            n = self.cuentas_por_sesion
+            for i in range(0, len(nuevas), n):
+                self.executor.submit(self.worker_lote, nuevas[i:i + n])
+
     # ------------------ Selenium / CAPTCHA ------------------
     def inicializar_selenium(self):
         options = webdriver.ChromeOptions()
@@ -251,8 +658,11 @@ class BotVisado:
         options.add_argument("--disable-dev-shm-usage")
         options.add_argument("--disable-gpu")
         options.add_argument("--window-size=1920,1080")
-        # Railway requiere chrome + chromedriver build; asumimos disponible
-        driver = webdriver.Chrome(options=options)
+        if self.remotos:
+            driver = self.remotos.crear(options)
+        else:
+            # Railway requiere chrome + chromedriver build; asumimos disponible
+            driver = webdriver.Chrome(options=options)
         wait = WebDriverWait(driver, 20)
         return driver, wait
 
@@ -274,26 +684,31 @@ class BotVisado:
             tmp = os.path.join(tempfile.gettempdir(), f"captcha_{int(time.time()*1000)}.png")
             with open(tmp, "wb") as f:
                 f.write(data)
-            self.logger.debug(f"Captcha guardado temporalmente: {tmp}")
+            self.logger.debug("Captcha guardado temporalmente: %s", tmp)
             return tmp
         except Exception as e:
-            self.logger.error(f"Error capturando CAPTCHA: {e}")
+            self.logger.error("Error capturando CAPTCHA: %s", e, extra={"cuenta": identificador, "etapa": "captcha"})
             return None
 
-    def resolver_captcha(self, image_path, identificador=None):
+    def resolver_captcha(self, image_path, identificador=None, detalle=None):
+        """`detalle` (dict opcional) recibe las salidas y tiempos de cada solver para el grabador"""
+        if detalle is None:
+            detalle = {}
         min_len = int(self.config.get('ocr_min_len', 4))
         conf_threshold = float(self.config.get('crnn', {}).get('conf_threshold', 0.5))
         # Intentar CRNN primero
         if self.crnn:
             try:
+                t0 = time.perf_counter()
                 pred, conf = self.crnn.predict(image_path)
+                detalle.update(crnn_pred=pred, crnn_conf=round(conf, 4), crnn_ms=round((time.perf_counter() - t0) * 1000, 1))
                 if pred and len(pred) >= min_len and conf >= conf_threshold:
-                    self.logger.info(f"CRNN -> '{pred}' (conf={conf:.3f})")
+                    self.logger.info("CRNN -> '%s' (conf=%.3f)", pred, conf, extra={"cuenta": identificador, "etapa": "captcha"})
                     return pred, 'crnn', conf
                 else:
-                    self.logger.info(f"CRNN: pred='{pred}' len={len(pred)} conf={conf:.3f} -> fallback a Tesseract")
+                    self.logger.info("CRNN: pred='%s' len=%d conf=%.3f -> fallback a Tesseract", pred, len(pred), conf, extra={"cuenta": identificador, "etapa": "captcha"})
             except Exception as e:
-                self.logger.error(f"Error CRNN: {e}")
+                self.logger.error("Error CRNN: %s", e, extra={"cuenta": identificador, "etapa": "captcha"})
 
         # Fallback Tesseract
         try:
@@ -302,13 +717,15 @@ class BotVisado:
             img = img.resize((img.width * 3, img.height * 3), Image.LANCZOS)
             img = img.convert("L")
             img = ImageEnhance.Contrast(img).enhance(3.0)
+            t0 = time.perf_counter()
             raw = pytesseract.image_to_string(img, config='--oem 3 --psm 8').strip()
             cleaned = ''.join(ch for ch in raw if ch.isalnum())
+            detalle.update(tesseract=cleaned, tesseract_ms=round((time.perf_counter() - t0) * 1000, 1))
             if len(cleaned) >= min_len:
-                self.logger.info(f"Tesseract -> '{cleaned}'")
+                self.logger.info("Tesseract -> '%s'", cleaned, extra={"cuenta": identificador, "etapa": "captcha"})
                 return cleaned, 'tesseract', 0.0
         except Exception as e:
-            self.logger.warning(f"Tesseract falló: {e}")
+            self.logger.warning("Tesseract falló: %s", e, extra={"cuenta": identificador, "etapa": "captcha"})
 
         return "", 'none', 0.0
 
@@ -317,7 +734,7 @@ class BotVisado:
         timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
         if self.db:
             ok = self.db.guardar_estado(identificador, estado)
-            self.db.registrar_verificacion(identificador, estado, exitoso=True)
+            self.registrar_verificacion(nombre, identificador, estado, True)
             return ok
         else:
             # fallback local: archivo simple + historial append
@@ -326,20 +743,67 @@ class BotVisado:
                 os.makedirs(base, exist_ok=True)
                 with open(os.path.join(base, f"{identificador}.txt"), "w", encoding="utf-8") as f:
                     f.write(estado + "\n" + timestamp)
-                # append historial
-                with open(os.path.join(base, "historial.log"), "a", encoding="utf-8") as f:
-                    f.write(json.dumps({"nombre": nombre, "identificador": identificador, "fecha_hora": timestamp, "estado": estado, "exitoso": True}, ensure_ascii=False) + "\n")
-                return True
             except Exception as e:
-                self.logger.error(f"No se pudo guardar estado local: {e}")
+                self.logger.error("No se pudo guardar estado local: %s", e, extra={"cuenta": identificador})
                 return False
+            return self.registrar_verificacion(nombre, identificador, estado, True)
+
+    def registrar_verificacion(self, nombre, identificador, estado, exitoso):
+        """Añade la verificación al historial (DB o log local) y a los contadores en memoria"""
+        fecha_hora = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.contadores.registrar(identificador, 'OK' if exitoso else estado, exitoso, fecha_hora=fecha_hora, estado=estado)
+        if self.db:
+            return self.db.registrar_verificacion(identificador, estado, exitoso)
+        try:
+            os.makedirs("estado_local", exist_ok=True)
+            with open(os.path.join("estado_local", "historial.log"), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"nombre": nombre, "identificador": identificador, "fecha_hora": fecha_hora, "estado": estado, "exitoso": exitoso}, ensure_ascii=False) + "\n")
+            return True
+        except Exception as e:
+            self.logger.error("No se pudo registrar verificación local: %s", e, extra={"cuenta": identificador})
+            return False
+
+    def _cargar_contadores(self):
+        """Rehidrata los contadores por hora desde la DB o el historial local (solo al arrancar)"""
+        self.contadores = ContadoresVentana(retencion_horas=max(self.summary_hours, 24))
+        desde = (datetime.now() - timedelta(hours=self.contadores.retencion_horas)).strftime('%Y-%m-%d %H:%M:%S')
+        n = 0
+        try:
+            if self.db:
+                for fila in self.db.cargar_agregados_por_hora(desde):
+                    self.contadores.registrar_hora(fila['identificador'], fila['hora'], fila['fuente'], fila['exitoso'],
+                                                   fila['n'], ultima=fila['ultima'])
+                    n += fila['n']
+                # último estado conocido de cada cuenta
+                for c in self.cuentas:
+                    estado = self.db.cargar_estado_anterior(c.get('identificador'))
+                    if estado:
+                        self.contadores.fijar_estado(c.get('identificador'), estado)
+            else:
+                hist_path = os.path.join("estado_local", "historial.log")
+                if os.path.exists(hist_path):
+                    with open(hist_path, "r", encoding="utf-8") as f:
+                        for line in f:
+                            try:
+                                obj = json.loads(line)
+                                if obj['fecha_hora'] < desde:
+                                    continue
+                                exitoso = bool(obj.get('exitoso'))
+                                self.contadores.registrar_hora(obj['identificador'], obj['fecha_hora'][:13], 'OK' if exitoso else obj.get('estado'),
+                                                               exitoso, 1, ultima=obj['fecha_hora'], estado=obj.get('estado'))
+                                n += 1
+                            except Exception:
+                                continue
+            self.logger.info(f"Contadores rehidratados: {n} verificaciones de las últimas {self.contadores.retencion_horas:g}h")
+        except Exception as e:
+            self.logger.error(f"Error rehidratando contadores: {e}")
 
     def cargar_estado_anterior(self, identificador):
         if self.db:
             try:
                 return self.db.cargar_estado_anterior(identificador)
             except Exception as e:
-                self.logger.error(f"Error cargando estado anterior desde DB: {e}")
+                self.logger.error("Error cargando estado anterior desde DB: %s", e, extra={"cuenta": identificador})
                 return None
         else:
             try:
@@ -349,7 +813,7 @@ class BotVisado:
                         return f.readline().strip()
                 return None
             except Exception as e:
-                self.logger.error(f"Error cargando estado local: {e}")
+                self.logger.error("Error cargando estado local: %s", e, extra={"cuenta": identificador})
                 return None
 
     def es_primer_monitoreo(self, identificador):
@@ -394,10 +858,10 @@ class BotVisado:
                 self.logger.info(f"Correo enviado a {email_dest} (asunto: {asunto})")
                 return True
             else:
-                self.logger.error(f"Error Resend API: {resp.status_code} - {resp.text}")
+                self.logger.error("Error Resend API: %s - %s", resp.status_code, resp.text)
                 return False
         except Exception as e:
-            self.logger.error(f"Excepción al enviar correo via Resend: {e}")
+            self.logger.error("Excepción al enviar correo via Resend: %s", e)
             return False
 
     def enviar_notificacion_primer_monitoreo(self, nombre, identificador, estado):
@@ -458,69 +922,49 @@ class BotVisado:
           <div style="color:#9fb3d6; font-size:13px;">{periodo_texto}</div>
           {stats_html}
           <table role="presentation">
-            <thead><tr><th>Hora</th><th>Cuenta</th><th>Estado</th><th>Resultado</th></tr></thead>
+            <thead><tr><th>Cuenta</th><th>Último estado</th><th>Exitosos</th><th>Errores</th><th>Éxito</th><th>Última consulta OK</th></tr></thead>
             <tbody>{rows_html}</tbody>
           </table>
           <div style="margin-top:12px; font-size:12px; color:#93b0d6;">Enviado por Bot Visado • {time.strftime('%Y-%m-%d %H:%M:%S')}</div>
         </div></body></html>"""
         return html
 
+    def _filas_resumen(self, agregados, max_filas):
+        """Genera una fila por cuenta (no por intento), como mucho `max_filas`"""
+        nombres = {c.get('identificador'): c.get('nombre', 'Sin nombre') for c in self.cuentas}
+        # primero las cuentas con más errores
+        orden = sorted(agregados.items(), key=lambda kv: (-kv[1]['errores'], kv[0] or ''))
+        for ident, a in orden[:max_filas]:
+            total = a['exitosos'] + a['errores']
+            tasa = round(a['exitosos'] / total * 100, 1) if total else 0
+            fecha, estado = a['ultimo'] or ('-', '-')
+            detalle = ', '.join(f"{f}: {n}" for f, n in a['fuentes'].most_common(3))
+            errores = f"<span class='err'>{a['errores']}</span>" + (f" ({detalle})" if detalle else "")
+            yield (f"<tr><td>{nombres.get(ident, 'Sin nombre')} ({ident})</td><td>{estado}</td>"
+                   f"<td><span class='ok'>{a['exitosos']}</span></td><td>{errores}</td><td>{tasa}%</td><td>{fecha}</td></tr>")
+        if len(orden) > max_filas:
+            yield f"<tr><td colspan='6' style='color:#9fb3d6;padding:12px;'>… y {len(orden) - max_filas} cuentas más.</td></tr>"
+
     def enviar_resumen_12h(self):
-        # Construir resumen desde DB o logs locales
+        # Construir resumen desde los contadores en memoria (O(horas x cuentas))
         try:
             now = datetime.now()
             cutoff = now - timedelta(hours=self.summary_hours)
-            rows = []
+            agregados = self.contadores.agregados(cutoff.timestamp())
             estadisticas = {"exitosos": 0, "errores": 0, "total": 0, "tasa_exito": 0}
-            
-            if self.db:
-                # cargar historial desde db para cada cuenta
-                for c in self.cuentas:
-                    ident = c.get('identificador')
-                    nombre = c.get('nombre', 'Sin nombre')
-                    hist = self.db.cargar_historial(ident, limite=1000)
-                    for e in hist:
-                        try:
-                            fh = e.get('fecha_hora')
-                            dt = datetime.strptime(fh, '%Y-%m-%d %H:%M:%S')
-                            if dt >= cutoff:
-                                resultado = "<span class='ok'>OK</span>" if e.get('exitoso') else "<span class='err'>ERROR</span>"
-                                rows.append(f"<tr><td>{fh}</td><td>{nombre} ({ident})</td><td>{e.get('estado')}</td><td>{resultado}</td></tr>")
-                                estadisticas['total'] += 1
-                                if e.get('exitoso'):
-                                    estadisticas['exitosos'] += 1
-                                else:
-                                    estadisticas['errores'] += 1
-                        except Exception:
-                            continue
-            else:
-                # leer historial local
-                hist_path = os.path.join("estado_local", "historial.log")
-                if os.path.exists(hist_path):
-                    with open(hist_path, "r", encoding="utf-8") as f:
-                        for line in reversed(f.readlines()):
-                            try:
-                                obj = json.loads(line.strip())
-                                dt = datetime.strptime(obj['fecha_hora'], '%Y-%m-%d %H:%M:%S')
-                                if dt >= cutoff:
-                                    nombre = obj.get('nombre', 'Sin nombre')
-                                    resultado = "<span class='ok'>OK</span>" if obj.get('exitoso') else "<span class='err'>ERROR</span>"
-                                    rows.append(f"<tr><td>{obj['fecha_hora']}</td><td>{nombre} ({obj['identificador']})</td><td>{obj['estado']}</td><td>{resultado}</td></tr>")
-                                    estadisticas['total'] += 1
-                                    if obj.get('exitoso'):
-                                        estadisticas['exitosos'] += 1
-                                    else:
-                                        estadisticas['errores'] += 1
-                            except Exception:
-                                continue
+            for a in agregados.values():
+                estadisticas['exitosos'] += a['exitosos']
+                estadisticas['errores'] += a['errores']
+            estadisticas['total'] = estadisticas['exitosos'] + estadisticas['errores']
 
             # Calcular tasa de éxito
             if estadisticas['total'] > 0:
                 estadisticas['tasa_exito'] = round((estadisticas['exitosos'] / estadisticas['total']) * 100, 1)
             
-            periodo_texto = f"Resumen desde {cutoff.strftime('%Y-%m-%d %H:%M:%S')} hasta {now.strftime('%Y-%m-%d %H:%M:%S')}"
+            periodo_texto = f"Resumen desde {cutoff.strftime('%Y-%m-%d %H:00')} hasta {now.strftime('%Y-%m-%d %H:%M:%S')}"
+            max_filas = int(self.config.get('resumen_max_filas', 50))
             html = self.generar_html_resumen(
-                ''.join(rows) or "<tr><td colspan='4' style='color:#9fb3d6;padding:12px;'>No hubo actividad en el periodo.</td></tr>", 
+                ''.join(self._filas_resumen(agregados, max_filas)) or "<tr><td colspan='6' style='color:#9fb3d6;padding:12px;'>No hubo actividad en el periodo.</td></tr>", 
                 periodo_texto, 
                 estadisticas
             )
@@ -531,27 +975,83 @@ class BotVisado:
             self.logger.error(f"Error generando/enviando resumen: {e}")
 
     # ------------------ Flujo por cuenta (monitoreo) ------------------
-    def consultar_estado_para_cuenta(self, driver, wait, nombre, identificador, ano_nacimiento):
+    def _metricas_sesion_vacias(self):
+        return {
+            "sesiones_creadas": 0, "sesiones_evitadas": 0,
+            "cargas_pagina": 0,
+            "captchas_resueltos": 0, "captchas_evitados": 0,
+        }
+
+    def _contar(self, clave, n=1):
+        with self._lock_metricas:
+            self.metricas_sesion[clave] += n
+
+    def _cargar_formulario(self, driver, reintento=False):
+        self._gobernar("cargas", reintento=reintento)
+        driver.get(URL_CONSULTA)
+        self._contar("cargas_pagina")
+
+    def _volver_al_formulario(self, driver, wait):
+        """
+        Recarga el formulario de consulta dentro de la misma sesión (cookies calientes).
+        No se usa back(): el formulario saldría de la caché con el CAPTCHA ya enviado.
+        """
+        try:
+            self._cargar_formulario(driver)
+            wait.until(EC.presence_of_element_located((By.ID, "txIdentificador")))
+            return True
+        except Exception as e:
+            self.logger.debug(f"No se pudo volver al formulario: {e}")
+            return False
+
+    def _captcha_requerido(self, driver):
+        """El sitio pide CAPTCHA solo si la imagen está presente en el formulario"""
+        try:
+            return any(el.is_displayed() for el in driver.find_elements(By.ID, "imagenCaptcha"))
+        except Exception:
+            return True
+
+    def consultar_estado_para_cuenta(self, driver, wait, nombre, identificador, ano_nacimiento, formulario_listo=False):
         for intento in range(1, self.MAX_REINTENTOS + 1):
-            self.logger.info(f"[{nombre} ({identificador})] Intento {intento}/{self.MAX_REINTENTOS}")
+            ctx = {"cuenta": identificador, "intento": intento}
+            registro = None
+            self.logger.info("[%s (%s)] Intento %d/%d", nombre, identificador, intento, self.MAX_REINTENTOS, extra=dict(ctx, etapa="carga"))
             try:
-                driver.get("https://sutramiteconsular.maec.es/")
-                time.sleep(random.uniform(1.5, 3.0))
-                captcha_path = self.capturar_captcha(driver, wait, identificador)
-                if not captcha_path:
-                    time.sleep(1.0)
-                    continue
+                # Solo el primer intento aprovecha el formulario recién cargado; los reintentos recargan
+                if not (intento == 1 and formulario_listo):
+                    self._cargar_formulario(driver, reintento=intento > 1)
+                    time.sleep(random.uniform(1.5, 3.0))
 
-                pred, src, conf = self.resolver_captcha(captcha_path, identificador)
-                try:
-                    os.remove(captcha_path)
-                except Exception:
-                    pass
+                pred = None
+                if intento == 1 and formulario_listo and not self._captcha_requerido(driver):
+                    self._contar("captchas_evitados")
+                else:
+                    captcha_path = self.capturar_captcha(driver, wait, identificador)
+                    if not captcha_path:
+                        time.sleep(1.0)
+                        continue
 
-                if not pred:
-                    self.logger.warning(f"[{nombre} ({identificador})] No se obtuvo predicción válida; reintentando.")
-                    time.sleep(1.5)
-                    continue
+                    detalle = {}
+                    t0 = time.perf_counter()
+                    pred, src, conf = self.resolver_captcha(captcha_path, identificador, detalle)
+                    if self.grabador:
+                        try:
+                            with open(captcha_path, "rb") as f:
+                                registro = dict(detalle, imagen=f.read(), cuenta=identificador, intento=intento,
+                                                fuente=src, enviado=pred, resolver_ms=round((time.perf_counter() - t0) * 1000, 1))
+                        except Exception as e:
+                            self.logger.debug(f"No se pudo leer el CAPTCHA para grabarlo: {e}")
+                    try:
+                        os.remove(captcha_path)
+                    except Exception:
+                        pass
+
+                    if not pred:
+                        self._grabar_captcha(registro, "sin_prediccion")
+                        self.logger.warning("[%s (%s)] No se obtuvo predicción válida; reintentando.", nombre, identificador, extra=dict(ctx, etapa="captcha"))
+                        time.sleep(1.5)
+                        continue
+                    self._contar("captchas_resueltos")
 
                 # Interactuar formulario
                 try:
@@ -559,18 +1059,21 @@ class BotVisado:
                     Select(tipo_el).select_by_value("VISADO")
                     id_input = wait.until(EC.presence_of_element_located((By.ID, "txIdentificador")))
                     ano_input = wait.until(EC.presence_of_element_located((By.ID, "txtFechaNacimiento")))
-                    captcha_input = wait.until(EC.presence_of_element_located((By.ID, "imgcaptcha")))
                     submit_button = wait.until(EC.element_to_be_clickable((By.ID, "imgVerSuTramite")))
                     id_input.clear(); id_input.send_keys(identificador)
                     ano_input.clear(); ano_input.send_keys(ano_nacimiento)
-                    captcha_input.clear(); captcha_input.send_keys(pred)
+                    if pred is not None:
+                        captcha_input = wait.until(EC.presence_of_element_located((By.ID, "imgcaptcha")))
+                        captcha_input.clear(); captcha_input.send_keys(pred)
                     time.sleep(random.uniform(0.4, 1.2))
+                    self._gobernar("envios", reintento=intento > 1)
                     try:
                         submit_button.click()
                     except Exception:
                         driver.execute_script("arguments[0].click();", submit_button)
                 except Exception as e:
-                    self.logger.error(f"[{nombre} ({identificador})] Error al interactuar con el formulario: {e}")
+                    self.logger.error("[%s (%s)] Error al interactuar con el formulario: %s", nombre, identificador, e, extra=dict(ctx, etapa="formulario"))
+                    self._grabar_captcha(registro, "sin_envio")
                     time.sleep(1.0)
                     continue
 
@@ -580,51 +1083,113 @@ class BotVisado:
                     titulo = driver.find_element(By.ID, "ContentPlaceHolderConsulta_TituloEstado").text.strip()
                     desc = driver.find_element(By.ID, "ContentPlaceHolderConsulta_DescEstado").text.strip()
                     estado = f"{titulo} - {desc}"
-                    self.logger.info(f"[{nombre} ({identificador})] Estado extraído: {estado}")
+                    self.logger.info("[%s (%s)] Estado extraído: %s", nombre, identificador, estado, extra=dict(ctx, etapa="estado"))
+                    self._reportar_sitio(True)
+                    self._grabar_captcha(registro, "aceptado")
                     return estado
                 except Exception:
                     # comprobar mensaje de captcha rechazado
                     try:
                         err_el = driver.find_element(By.ID, "CompararCaptcha")
                         if err_el and "no concuerdan con la imagen" in err_el.text.lower():
-                            self.logger.warning(f"[{nombre} ({identificador})] El servidor indica que el CAPTCHA no coincide.")
+                            self.logger.warning("[%s (%s)] El servidor indica que el CAPTCHA no coincide.", nombre, identificador, extra=dict(ctx, etapa="estado"))
+                            self._reportar_sitio(False, rechazo_captcha=True)
+                            self._grabar_captcha(registro, "rechazado")
                             # registrar intento fallido
-                            if self.db:
-                                self.db.registrar_verificacion(identificador, "CAPTCHA_INCORRECTO", False)
-                            else:
-                                with open(os.path.join("estado_local", "historial.log"), "a", encoding="utf-8") as f:
-                                    f.write(json.dumps({"nombre": nombre, "identificador": identificador, "fecha_hora": time.strftime('%Y-%m-%d %H:%M:%S'), "estado": "CAPTCHA_INCORRECTO", "exitoso": False}, ensure_ascii=False) + "\n")
+                            self.registrar_verificacion(nombre, identificador, "CAPTCHA_INCORRECTO", False)
                             time.sleep(1.5)
                             continue
                     except Exception:
                         pass
-                    self.logger.warning(f"[{nombre} ({identificador})] No se pudo extraer estado; reintentando.")
+                    self.logger.warning("[%s (%s)] No se pudo extraer estado; reintentando.", nombre, identificador, extra=dict(ctx, etapa="estado"))
+                    self._reportar_sitio(False)
+                    self._grabar_captcha(registro, "desconocido")
                     time.sleep(1.5)
                     continue
 
             except WebDriverException as e:
-                self.logger.critical(f"[{nombre} ({identificador})] Error crítico WebDriver: {e}")
+                self.logger.critical("[%s (%s)] Error crítico WebDriver: %s", nombre, identificador, e, extra=ctx)
+                self._reportar_sitio(False)
+                self._grabar_captcha(registro, "desconocido")
                 return None
             except Exception as e:
-                self.logger.error(f"[{nombre} ({identificador})] Error inesperado: {e}")
+                self.logger.error("[%s (%s)] Error inesperado: %s", nombre, identificador, e, extra=ctx)
+                self._grabar_captcha(registro, "desconocido")
                 time.sleep(1.5)
                 continue
 
-        self.logger.error(f"[{nombre} ({identificador})] Agotados intentos ({self.MAX_REINTENTOS}) sin éxito")
+        self.logger.error("[%s (%s)] Agotados intentos (%s) sin éxito", nombre, identificador, self.MAX_REINTENTOS,
+                          extra={"cuenta": identificador})
         return None
 
     # Worker por cuenta (usa executor)
     def worker_cuenta(self, cuenta):
+        self.worker_lote([cuenta])
+
+    # Worker por lote: varias cuentas seguidas sobre una misma sesión de Chrome
+    def worker_lote(self, cuentas):
+        driver = wait = None
+        formulario_listo = False
+        try:
+            for cuenta in cuentas:
+                if driver is None:
+                    try:
+                        driver, wait = self.inicializar_selenium()
+                    except Exception as e:
+                        # sin sesión para esta cuenta; la siguiente del lote vuelve a intentarlo
+                        self.logger.error("[%s (%s)] Error en worker: no se pudo iniciar el navegador: %s",
+                                          cuenta.get('nombre', 'Sin nombre'), cuenta.get('identificador'), e,
+                                          extra={"cuenta": cuenta.get('identificador'), "etapa": "sesion"})
+                        driver = wait = None
+                        continue
+                    self._contar("sesiones_creadas")
+                    formulario_listo = False
+                    if self.supervisor:
+                        self.supervisor.registrar(driver, cuenta.get('identificador'))
+                else:
+                    self._contar("sesiones_evitadas")
+                    if self.supervisor:
+                        self.supervisor.marcar_cuenta(driver, cuenta.get('identificador'))
+                estado_actual = self._procesar_cuenta(driver, wait, cuenta, formulario_listo)
+                formulario_listo = estado_actual is not None and self._volver_al_formulario(driver, wait)
+                if not formulario_listo and not self._sesion_viva(driver):
+                    # la sesión murió: la siguiente cuenta abre una nueva
+                    self._cerrar_driver(driver)
+                    driver = wait = None
+        finally:
+            self._cerrar_driver(driver)
+
+    def _sesion_viva(self, driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _cerrar_driver(self, driver):
+        if not driver:
+            return
+        try:
+            driver.quit()
+        except Exception as e:
+            self.logger.warning("driver.quit() falló: %s", e)
+        if self.supervisor:
+            self.supervisor.liberar(driver)
+        # El hueco vuelve al balanceador que creó la sesión, aunque una recarga lo haya sustituido
+        remotos = getattr(driver, "balanceador_remoto", None)
+        if remotos:
+            remotos.liberar(driver)
+
+    def _procesar_cuenta(self, driver, wait, cuenta, formulario_listo=False):
+        """Consulta una cuenta y registra/notifica el resultado. Devuelve el estado o None."""
         nombre = cuenta.get('nombre', 'Sin nombre')
         identificador = cuenta.get('identificador')
         ano_nacimiento = cuenta.get('año_nacimiento') or cuenta.get('ano_nacimiento') or ""
-        driver = None
         try:
-            driver, wait = self.inicializar_selenium()
-            estado_actual = self.consultar_estado_para_cuenta(driver, wait, nombre, identificador, ano_nacimiento)
+            estado_actual = self.consultar_estado_para_cuenta(driver, wait, nombre, identificador, ano_nacimiento, formulario_listo)
             if estado_actual is None:
-                self.logger.warning(f"[{nombre} ({identificador})] No se obtuvo estado en esta ejecución.")
-                return
+                self.logger.warning("[%s (%s)] No se obtuvo estado en esta ejecución.", nombre, identificador, extra={"cuenta": identificador})
+                return None
                 
             estado_anterior = self.cargar_estado_anterior(identificador)
             
@@ -644,37 +1209,64 @@ class BotVisado:
                 self.enviar_notificacion(asunto, f"<pre>{cuerpo}</pre>", destinatario=cuenta.get('email_notif') or None, es_html=True)
                 self.logger.info(f"[{nombre} ({identificador})] Cambio detectado y notificado.")
             else:
-                # si no hubo cambio igual registramos verificación (si DB lo requiere)
-                if self.db:
-                    self.db.registrar_verificacion(identificador, estado_actual, True)
-                else:
-                    with open(os.path.join("estado_local", "historial.log"), "a", encoding="utf-8") as f:
-                        f.write(json.dumps({"nombre": nombre, "identificador": identificador, "fecha_hora": time.strftime('%Y-%m-%d %H:%M:%S'), "estado": estado_actual, "exitoso": True}, ensure_ascii=False) + "\n")
+                # si no hubo cambio igual registramos verificación
+                self.registrar_verificacion(nombre, identificador, estado_actual, True)
                 self.logger.info(f"[{nombre} ({identificador})] Sin cambios (estado: {estado_actual})")
+            return estado_actual
         except Exception as e:
-            self.logger.error(f"[{nombre} ({identificador})] Error en worker: {e}")
-        finally:
-            try:
-                if driver:
-                    driver.quit()
-            except Exception:
-                pass
+            self.logger.error("[%s (%s)] Error en worker: %s", nombre, identificador, e, extra={"cuenta": identificador})
+            return None
 
     # ------------------ Monitoreo programado ------------------
     def ejecutar_monitoreo(self):
-        self.logger.info("Iniciando ciclo de monitoreo para todas las cuentas...")
+        self._ciclo += 1
+        self.logger.info(f"Iniciando ciclo de monitoreo {self._ciclo} para todas las cuentas...")
+        self.metricas_sesion = self._metricas_sesion_vacias()
+        self._aplicar_perfiles_pendientes()
+        perfilar = self.perfilador.consumir_ciclo()
+        if perfilar:
+            self.perfilador.iniciar()
         try:
-            list(self.executor.map(self.worker_cuenta, self.cuentas))
-            self.logger.info("Ciclo de monitoreo finalizado.")
+            n = self.cuentas_por_sesion
+            lotes = [self.cuentas[i:i + n] for i in range(0, len(self.cuentas), n)]
+            list(self.executor.map(self.worker_lote, lotes))
+            m = self.metricas_sesion
+            self.logger.info(f"Ciclo de monitoreo finalizado. Sesiones: {m['sesiones_creadas']} creadas/{m['sesiones_evitadas']} evitadas; "
+                             f"cargas: {m['cargas_pagina']}; captchas: {m['captchas_resueltos']}/{m['captchas_evitados']} evitados")
+            if self.gobernador:
+                self.logger.info(f"Gobernador de peticiones: {self.gobernador.resumen()}")
+            if self.supervisor:
+                self.supervisor.barrer_huerfanos()
+                self.logger.info(f"Procesos Chrome: {self.supervisor.resumen()}")
+            if self.remotos:
+                self.logger.info(f"Nodos WebDriver remotos: {self.remotos.resumen()}")
         except Exception as e:
             self.logger.error(f"Error en ejecución de monitoreo: {e}")
+        finally:
+            if perfilar:
+                try:
+                    self.perfilador.detener(self._ciclo, [c.get('identificador') or '' for c in self.cuentas])
+                except Exception as e:
+                    self.logger.error(f"Error escribiendo el perfil del ciclo {self._ciclo}: {e}")
+
+    def _programar_tareas(self):
+        for job in (self._job_monitoreo, self._job_resumen):
+            if job:
+                schedule.cancel_job(job)
+        self._job_monitoreo = schedule.every(self.interval_hours).hours.do(self.ejecutar_monitoreo)
+        self._job_resumen = schedule.every(self.summary_hours).hours.do(self.enviar_resumen_12h)
 
     def iniciar(self):
         # Programar tareas
         self.logger.info("Iniciando scheduler (bot 24/7).")
         schedule.clear()
-        schedule.every(self.interval_hours).hours.do(self.ejecutar_monitoreo)
-        schedule.every(self.summary_hours).hours.do(self.enviar_resumen_12h)
+        self._programar_tareas()
+        # kill -HUP <pid> fuerza la recarga de config.yaml (además de detectar cambios en el archivo)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._solicitar_recarga)
+        # kill -USR1 <pid> perfila el próximo ciclo de monitoreo
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self._solicitar_perfil)
 
         # Ejecutar una vez al inicio
         self.ejecutar_monitoreo()
@@ -684,6 +1276,8 @@ class BotVisado:
         try:
             while self.running:
                 schedule.run_pending()
+                self._revisar_recarga_config()
+                self._aplicar_perfiles_pendientes()
                 time.sleep(10)  # ciclo de espera (10s)
         except KeyboardInterrupt:
             self.logger.info("Interrupción por teclado; cerrando bot...")
@@ -695,6 +1289,9 @@ class BotVisado:
                 self.executor.shutdown(wait=True)
             except:
                 pass
+            if self.supervisor:
+                self.supervisor.detener()
+                self.supervisor.barrer_huerfanos()
             self.logger.info("Bot detenido.")
 
 # ------------------ Ejecución principal ------------------
@@ -0,0 +1,64 @@
+# contadores.py
+import time
+import threading
+from collections import Counter
+from datetime import datetime
+
+
+class ContadoresVentana:
+    """
+    Contadores de verificaciones en cubetas de una hora, por cuenta y fuente
+    ('OK' para éxitos, el estado de error p.ej. 'CAPTCHA_INCORRECTO' para fallos).
+    Se actualizan al registrar cada verificación, así el resumen cuesta
+    O(horas x cuentas) sin importar cuántos intentos hubo.
+    """
+
+    SEGUNDOS_CUBETA = 3600
+
+    def __init__(self, retencion_horas=24):
+        self.retencion_horas = float(retencion_horas)
+        self._lock = threading.Lock()
+        self._cubetas = {}  # n.º de cubeta -> Counter{(identificador, fuente, exitoso): n}
+        self._ultimo = {}   # identificador -> (fecha_hora, estado) de la última verificación exitosa
+
+    def registrar(self, identificador, fuente, exitoso, n=1, ts=None, fecha_hora=None, estado=None):
+        ts = time.time() if ts is None else ts
+        cubeta = int(ts // self.SEGUNDOS_CUBETA)
+        with self._lock:
+            self._cubetas.setdefault(cubeta, Counter())[(identificador, fuente, bool(exitoso))] += n
+            if exitoso and fecha_hora and (identificador not in self._ultimo or fecha_hora >= self._ultimo[identificador][0]):
+                self._ultimo[identificador] = (fecha_hora, estado if estado is not None else fuente)
+            self._podar(int(time.time() // self.SEGUNDOS_CUBETA))
+
+    def registrar_hora(self, identificador, hora, fuente, exitoso, n, ultima=None, estado=None):
+        """Rehidratación: `hora` es 'YYYY-mm-dd HH' en hora local (como fecha_hora en el historial)"""
+        ts = datetime.strptime(hora, '%Y-%m-%d %H').timestamp()
+        self.registrar(identificador, fuente, exitoso, n=n, ts=ts, fecha_hora=ultima, estado=estado)
+
+    def fijar_estado(self, identificador, estado):
+        """Sustituye el estado mostrado para la última verificación conocida de la cuenta"""
+        with self._lock:
+            if identificador in self._ultimo:
+                self._ultimo[identificador] = (self._ultimo[identificador][0], estado)
+
+    def _podar(self, cubeta_actual):
+        limite = cubeta_actual - int(self.retencion_horas * 3600 // self.SEGUNDOS_CUBETA) - 1
+        for c in [c for c in self._cubetas if c < limite]:
+            del self._cubetas[c]
+
+    def agregados(self, desde_ts):
+        """Totales por cuenta desde `desde_ts` (redondeado al inicio de su cubeta)"""
+        desde = int(desde_ts // self.SEGUNDOS_CUBETA)
+        por_cuenta = {}
+        with self._lock:
+            for cubeta, contador in self._cubetas.items():
+                if cubeta < desde:
+                    continue
+                for (ident, fuente, exitoso), n in contador.items():
+                    a = por_cuenta.setdefault(ident, {"exitosos": 0, "errores": 0, "fuentes": Counter()})
+                    a["exitosos" if exitoso else "errores"] += n
+                    if not exitoso:
+                        a["fuentes"][fuente] += n
+            for ident, a in por_cuenta.items():
+                a["ultimo"] = self._ultimo.get(ident)
+        return por_cuenta
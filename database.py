@@ -54,6 +54,16 @@ class DatabaseManager:
                     )
                 """)
                 
+                # Cupos de peticiones compartidos entre réplicas (gobernador)
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS cupos_peticiones (
+                        clave VARCHAR(255) NOT NULL,
+                        ventana BIGINT NOT NULL,
+                        usados INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (clave, ventana)
+                    )
+                """)
+                
                 # Índices para mejor performance
                 cur.execute("CREATE INDEX IF NOT EXISTS idx_identificador ON estados_tramite(identificador)")
                 cur.execute("CREATE INDEX IF NOT EXISTS idx_historial_identificador ON historial_verificaciones(identificador)")
@@ -129,6 +139,29 @@ class DatabaseManager:
             self.logger.error(f"Error cargando historial desde DB: {e}")
             return []
     
+    def cargar_agregados_por_hora(self, desde):
+        """
+        Conteos de verificaciones agrupados por cuenta, hora ('YYYY-mm-dd HH') y fuente
+        ('OK' o el estado de error) desde `desde` ('YYYY-mm-dd HH:MM:SS')
+        """
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("""
+                    SELECT identificador,
+                           SUBSTRING(fecha_hora FROM 1 FOR 13) AS hora,
+                           CASE WHEN exitoso THEN 'OK' ELSE estado END AS fuente,
+                           exitoso,
+                           COUNT(*) AS n,
+                           MAX(fecha_hora) AS ultima
+                    FROM historial_verificaciones
+                    WHERE fecha_hora >= %s
+                    GROUP BY 1, 2, 3, 4
+                """, (desde,))
+                return [dict(row) for row in cur.fetchall()]
+        except Exception as e:
+            self.logger.error(f"Error cargando agregados desde DB: {e}")
+            return []
+    
     def registrar_verificacion(self, identificador, estado, exitoso=True):
         """Registrar nueva verificación en historial"""
         try:
@@ -144,6 +177,40 @@ class DatabaseManager:
             self.conn.rollback()
             return False
     
+    def reservar_cupo(self, clave, ventana, limite, cantidad=1):
+        """
+        Reservar hasta `cantidad` huecos en la ventana de peticiones compartida.
+        Devuelve cuántos se concedieron (0 si la ventana ya está llena).
+        Pensado para una conexión dedicada: no registra errores, los propaga.
+        """
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO cupos_peticiones (clave, ventana, usados)
+                    VALUES (%s, %s, 0)
+                    ON CONFLICT (clave, ventana) DO NOTHING
+                    RETURNING usados
+                """, (clave, ventana))
+                if cur.fetchone() is not None:
+                    # Ventana nueva: limpiar las antiguas
+                    cur.execute("DELETE FROM cupos_peticiones WHERE clave = %s AND ventana < %s", (clave, ventana - 1))
+                cur.execute(
+                    "SELECT usados FROM cupos_peticiones WHERE clave = %s AND ventana = %s FOR UPDATE",
+                    (clave, ventana)
+                )
+                usados = cur.fetchone()['usados']
+                concedidos = max(0, min(cantidad, limite - usados))
+                if concedidos:
+                    cur.execute(
+                        "UPDATE cupos_peticiones SET usados = usados + %s WHERE clave = %s AND ventana = %s",
+                        (concedidos, clave, ventana)
+                    )
+            self.conn.commit()
+            return concedidos
+        except Exception:
+            self.conn.rollback()
+            raise
+    
     def close(self):
         """Cerrar conexión"""
         if self.conn:
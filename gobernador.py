@@ -0,0 +1,183 @@
+# gobernador.py
+import math
+import time
+import threading
+import logging
+from collections import deque
+
+
+class GobernadorPeticiones:
+    """
+    Presupuesto global de peticiones hacia el sitio consular.
+    Token bucket compartido por todos los workers con ajuste AIMD de la tasa:
+    reduce a la mitad cuando suben los errores del sitio y sube poco a poco
+    cuando responde bien. Los rechazos de CAPTCHA son otra señal: dependen sobre
+    todo de la precisión del solver, así que solo cuentan si superan su propia
+    línea base en `margen_rechazo`. Si hay DB, el cupo se reparte entre réplicas:
+    se reserva por lotes (un viaje a la DB cada LOTE_CUPO peticiones) sobre una
+    conexión dedicada, que no comparte transacciones con el resto del bot.
+    """
+
+    VENTANA_GLOBAL_S = 10
+    LOTE_CUPO = 5
+    PAUSA_DB_S = 30
+    AVISO_DB_S = 300
+    ALFA_BASE_RECHAZO = 0.02
+
+    def __init__(self, tasa_inicial=2.0, tasa_min=0.2, tasa_max=4.0, rafaga=4,
+                 ventana=20, umbral_error=0.3, margen_rechazo=0.25, incremento=0.02,
+                 factor_reduccion=0.5, db=None, clave="sutramiteconsular"):
+        self.logger = logging.getLogger("BotVisado")
+        self.tasa_min = float(tasa_min)
+        self.tasa_max = float(tasa_max)
+        self.tasa = min(max(float(tasa_inicial), self.tasa_min), self.tasa_max)
+        self.rafaga = max(1.0, float(rafaga))
+        self.umbral_error = float(umbral_error)
+        self.margen_rechazo = float(margen_rechazo)
+        self.incremento = float(incremento)
+        self.factor_reduccion = float(factor_reduccion)
+        self.db = db
+        self.clave = clave
+        self.tokens = self.rafaga
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+        self._resultados = deque(maxlen=max(5, int(ventana)))  # respuestas del sitio (False = error)
+        # ventana más larga: los rechazos son ruidosos y solo interesa una subida sostenida
+        self._rechazos = deque(maxlen=max(40, 2 * int(ventana)))  # envíos (True = CAPTCHA rechazado)
+        self._base_rechazo = None
+        # cupo global reservado en la DB y aún sin usar (válido solo para su ventana)
+        self._lock_db = threading.Lock()
+        self._cupo_ventana = None
+        self._cupo_local = 0
+        self._db_pausa_hasta = 0.0
+        self._ultimo_aviso_db = 0.0
+        self._fallos_db = 0
+        self.stats = {"cargas": 0, "envios": 0, "reintentos": 0, "espera_s": 0.0,
+                      "reducciones": 0, "aumentos": 0}
+
+    def _rellenar(self):
+        ahora = time.monotonic()
+        self.tokens = min(self.rafaga, self.tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def _cupo_global(self):
+        """
+        Toma un hueco de la ventana global compartida (DB); devuelve los segundos a esperar
+        si está llena. Sin DB o con la DB fallando, no limita (queda el bucket local).
+        """
+        if not self.db:
+            return 0.0
+        ventana = int(time.time() // self.VENTANA_GLOBAL_S)
+        with self._lock_db:
+            if self._cupo_ventana != ventana:
+                self._cupo_ventana, self._cupo_local = ventana, 0
+            if self._cupo_local > 0:
+                self._cupo_local -= 1
+                return 0.0
+            if time.monotonic() < self._db_pausa_hasta:
+                return 0.0
+            limite = max(1, math.floor(self.tasa * self.VENTANA_GLOBAL_S))
+            try:
+                concedidos = self.db.reservar_cupo(self.clave, ventana, limite, min(self.LOTE_CUPO, limite))
+            except Exception as e:
+                self._db_pausa_hasta = time.monotonic() + self.PAUSA_DB_S
+                self._avisar_fallo_db(e)
+                return 0.0
+            if concedidos:
+                self._cupo_local = concedidos - 1
+                return 0.0
+        return (ventana + 1) * self.VENTANA_GLOBAL_S - time.time()
+
+    def _avisar_fallo_db(self, error):
+        """Un aviso cada AVISO_DB_S como mucho, con el número de fallos acumulados"""
+        self._fallos_db += 1
+        ahora = time.monotonic()
+        if ahora - self._ultimo_aviso_db >= self.AVISO_DB_S:
+            self.logger.warning("Gobernador: cupo global en DB no disponible (%d fallos); se usa solo el local durante %ds: %s",
+                                self._fallos_db, self.PAUSA_DB_S, error)
+            self._ultimo_aviso_db = ahora
+            self._fallos_db = 0
+
+    def cerrar(self):
+        """Cierra la conexión dedicada del cupo global"""
+        if self.db:
+            try:
+                self.db.close()
+            except Exception:
+                pass
+
+    def adquirir(self, tipo="cargas", reintento=False):
+        """Bloquea hasta que haya presupuesto para una petición (carga de página o envío)"""
+        inicio = time.monotonic()
+        while True:
+            with self._lock:
+                self._rellenar()
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    espera = 0.0
+                else:
+                    espera = (1.0 - self.tokens) / self.tasa
+            if espera:
+                time.sleep(espera)
+                continue
+            espera = self._cupo_global()
+            if not espera:
+                break
+            # ventana global llena: el token local se devuelve para el siguiente intento
+            with self._lock:
+                self.tokens = min(self.rafaga, self.tokens + 1.0)
+            time.sleep(espera)
+        with self._lock:
+            self.stats[tipo] = self.stats.get(tipo, 0) + 1
+            if reintento:
+                self.stats["reintentos"] += 1
+            self.stats["espera_s"] += time.monotonic() - inicio
+
+    def _reducir(self, motivo):
+        """Reducción multiplicativa (con self._lock tomado)"""
+        anterior = self.tasa
+        self.tasa = max(self.tasa_min, self.tasa * self.factor_reduccion)
+        self.stats["reducciones"] += 1
+        self.logger.warning("Gobernador: %s; tasa %.3f -> %.3f pet/s", motivo, anterior, self.tasa)
+
+    def registrar_resultado(self, ok, rechazo_captcha=False):
+        """
+        Informa la respuesta del sitio: ok=True estado obtenido, ok=False error del sitio
+        (timeout, página sin estado...). rechazo_captcha=True: el sitio respondió bien
+        pero el CAPTCHA enviado no coincidía.
+        """
+        with self._lock:
+            self._resultados.append(bool(ok) or rechazo_captcha)
+            if ok or rechazo_captcha:
+                self._rechazos.append(bool(rechazo_captcha))
+            n = len(self._resultados)
+            tasa_error = self._resultados.count(False) / n
+            if n >= 5 and tasa_error >= self.umbral_error:
+                self._resultados.clear()
+                self._reducir(f"{tasa_error:.0%} de errores del sitio")
+                return
+
+            m = len(self._rechazos)
+            if (ok or rechazo_captcha) and m == self._rechazos.maxlen:
+                tasa_rechazo = self._rechazos.count(True) / m
+                if self._base_rechazo is None:
+                    self._base_rechazo = tasa_rechazo
+                elif tasa_rechazo > self._base_rechazo + self.margen_rechazo:
+                    base = self._base_rechazo
+                    self._rechazos.clear()
+                    self._reducir(f"rechazos de CAPTCHA {tasa_rechazo:.0%} (base {base:.0%})")
+                    return
+                # la línea base sigue despacio a la tasa de fallos propia del solver
+                self._base_rechazo += self.ALFA_BASE_RECHAZO * (float(rechazo_captcha) - self._base_rechazo)
+
+            if ok and self.tasa < self.tasa_max:
+                self.tasa = min(self.tasa_max, self.tasa + self.incremento)
+                self.stats["aumentos"] += 1
+
+    def resumen(self):
+        with self._lock:
+            s = dict(self.stats)
+            s["tasa"] = round(self.tasa, 3)
+            s["base_rechazo"] = round(self._base_rechazo, 3) if self._base_rechazo is not None else None
+            s["espera_s"] = round(s["espera_s"], 1)
+            return s
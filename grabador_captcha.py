@@ -0,0 +1,151 @@
+# grabador_captcha.py
+"""
+Grabador de intentos de CAPTCHA y reproducción offline.
+
+Cada intento (imagen PNG, predicción CRNN, confianza, salida de Tesseract, tiempos y
+veredicto del servidor) se añade a un shard binario append-only; index.jsonl guarda
+una línea por registro con su posición en el shard y los metadatos.
+
+Formato de registro en el shard: <u32 len_meta><meta JSON><u32 len_img><img PNG>
+
+Reproducción (benchmark/regresión de un modelo sobre el corpus):
+    python grabador_captcha.py corpus_captcha --model final_crnn_epoch28.pth --mapping char_mapping.pkl
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+import threading
+import logging
+
+
+class GrabadorCaptcha:
+    def __init__(self, directorio="corpus_captcha", max_shard_mb=64):
+        self.logger = logging.getLogger("BotVisado")
+        self.directorio = directorio
+        self.max_shard = int(float(max_shard_mb) * 1024 * 1024)
+        self._lock = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+        self._indice = os.path.join(directorio, "index.jsonl")
+        existentes = sorted(f for f in os.listdir(directorio) if f.startswith("shard_") and f.endswith(".bin"))
+        self._shard_n = int(existentes[-1][6:-4]) if existentes else 0
+        self.grabados = 0
+
+    def _shard_actual(self):
+        path = os.path.join(self.directorio, f"shard_{self._shard_n:05d}.bin")
+        if os.path.exists(path) and os.path.getsize(path) >= self.max_shard:
+            self._shard_n += 1
+            path = os.path.join(self.directorio, f"shard_{self._shard_n:05d}.bin")
+        return path
+
+    def grabar(self, imagen, **meta):
+        """Añade un intento al corpus; meta: cuenta, crnn_pred, crnn_conf, tesseract, tiempos, veredicto..."""
+        meta.setdefault("ts", time.time())
+        cabecera = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        try:
+            with self._lock:
+                path = self._shard_actual()
+                with open(path, "ab") as f:
+                    offset = f.tell()
+                    f.write(struct.pack("<I", len(cabecera)) + cabecera + struct.pack("<I", len(imagen)) + imagen)
+                with open(self._indice, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(dict(meta, shard=os.path.basename(path), offset=offset), ensure_ascii=False) + "\n")
+                self.grabados += 1
+        except Exception as e:
+            self.logger.warning("No se pudo grabar el intento de CAPTCHA: %s", e)
+
+
+def leer_corpus(directorio):
+    """Itera (meta, imagen_bytes) en orden de grabación usando el índice"""
+    abiertos = {}
+    try:
+        with open(os.path.join(directorio, "index.jsonl"), "r", encoding="utf-8") as idx:
+            for linea in idx:
+                try:
+                    meta = json.loads(linea)
+                except ValueError:
+                    continue
+                f = abiertos.get(meta["shard"])
+                if f is None:
+                    f = abiertos[meta["shard"]] = open(os.path.join(directorio, meta["shard"]), "rb")
+                f.seek(meta["offset"])
+                (n,) = struct.unpack("<I", f.read(4))
+                f.seek(n, os.SEEK_CUR)
+                (m,) = struct.unpack("<I", f.read(4))
+                yield meta, f.read(m)
+    finally:
+        for f in abiertos.values():
+            f.close()
+
+
+def reproducir(directorio, predecir, limite=None):
+    """
+    Ejecuta `predecir(imagen_bytes) -> (texto, conf)` sobre el corpus.
+    Verdad conocida: en intentos 'aceptado' el texto enviado era correcto; en 'rechazado' era incorrecto.
+    """
+    res = {"total": 0, "aceptados": 0, "aciertos": 0, "rechazados": 0, "repite_error": 0, "tiempos_ms": []}
+    inicio = time.perf_counter()
+    for i, (meta, imagen) in enumerate(leer_corpus(directorio)):
+        if limite is not None and i >= limite:
+            break
+        t0 = time.perf_counter()
+        pred, _ = predecir(imagen)
+        res["tiempos_ms"].append((time.perf_counter() - t0) * 1000)
+        res["total"] += 1
+        enviado = meta.get("enviado")
+        if meta.get("veredicto") == "aceptado" and enviado:
+            res["aceptados"] += 1
+            res["aciertos"] += int(pred == enviado)
+        elif meta.get("veredicto") == "rechazado" and enviado:
+            res["rechazados"] += 1
+            res["repite_error"] += int(pred == enviado)
+    duracion = time.perf_counter() - inicio
+    tiempos = sorted(res.pop("tiempos_ms"))
+    if tiempos:
+        res["ms_medio"] = round(sum(tiempos) / len(tiempos), 2)
+        res["ms_p95"] = round(tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))], 2)
+        res["imagenes_s"] = round(len(tiempos) / duracion, 1) if duracion else None
+    if res["aceptados"]:
+        res["precision_aceptados"] = round(res["aciertos"] / res["aceptados"], 4)
+    return res
+
+
+def _predictor_crnn(args):
+    from bot_visado import CRNNPredictor
+    crnn = CRNNPredictor(args.model, args.mapping, device=args.device)
+    return crnn.predict_bytes
+
+
+def _predictor_tesseract(args):
+    import io
+    import pytesseract
+    from PIL import Image, ImageEnhance
+
+    def predecir(imagen):
+        img = Image.open(io.BytesIO(imagen))
+        img = img.resize((img.width * 3, img.height * 3), Image.LANCZOS).convert("L")
+        img = ImageEnhance.Contrast(img).enhance(3.0)
+        raw = pytesseract.image_to_string(img, config='--oem 3 --psm 8').strip()
+        return ''.join(ch for ch in raw if ch.isalnum()), 0.0
+    return predecir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reproduce un corpus de CAPTCHA grabado con un predictor")
+    parser.add_argument("directorio")
+    parser.add_argument("--backend", choices=("crnn", "tesseract"), default="crnn")
+    parser.add_argument("--model", default="final_crnn_epoch28.pth")
+    parser.add_argument("--mapping", default="char_mapping.pkl")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--limite", type=int, default=None)
+    args = parser.parse_args(argv)
+    predecir = _predictor_crnn(args) if args.backend == "crnn" else _predictor_tesseract(args)
+    print(json.dumps(reproducir(args.directorio, predecir, args.limite), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
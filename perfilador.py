@@ -0,0 +1,140 @@
+# perfilador.py
+import os
+import sys
+import json
+import time
+import threading
+import logging
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class PerfiladorMuestreo:
+    """
+    Perfilador por muestreo bajo demanda: durante los próximos N ciclos de monitoreo
+    toma las pilas de todos los hilos (workers, inferencia, principal) a `hz` muestras
+    por segundo y escribe pilas colapsadas (compatibles con flamegraph.pl / speedscope)
+    más un informe de funciones más costosas.
+    """
+
+    def __init__(self, directorio="perfiles", hz=50):
+        self.logger = logging.getLogger("BotVisado")
+        self.directorio = directorio
+        self.intervalo = 1.0 / max(1.0, float(hz))
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._pilas = Counter()
+        self._muestras = 0
+        self._parar = threading.Event()
+        self._hilo = None
+        self._servidor = None
+
+    # ---- disparadores ----
+    def solicitar(self, ciclos=1):
+        with self._lock:
+            self._pendientes += max(0, int(ciclos))
+            pendientes = self._pendientes
+        self.logger.info(f"Perfilador: se perfilarán los próximos {pendientes} ciclos")
+        return pendientes
+
+    def consumir_ciclo(self):
+        """True si el ciclo que empieza debe perfilarse (descuenta uno de los pendientes)"""
+        with self._lock:
+            if self._pendientes <= 0:
+                return False
+            self._pendientes -= 1
+            return True
+
+    def servir_http(self, puerto):
+        """Disparador local: GET http://127.0.0.1:<puerto>/perfil?ciclos=N"""
+        perfilador = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != "/perfil":
+                    self.send_error(404)
+                    return
+                try:
+                    ciclos = int(parse_qs(url.query).get("ciclos", ["1"])[0])
+                except ValueError:
+                    self.send_error(400, "ciclos debe ser un entero")
+                    return
+                cuerpo = json.dumps({"pendientes": perfilador.solicitar(ciclos)}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, fmt, *args):
+                perfilador.logger.debug("Perfilador HTTP: " + fmt, *args)
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", int(puerto)), Handler)
+        threading.Thread(target=self._servidor.serve_forever, name="PerfiladorHTTP", daemon=True).start()
+        self.logger.info(f"Perfilador: disparador HTTP en http://127.0.0.1:{puerto}/perfil?ciclos=N")
+
+    # ---- muestreo ----
+    @staticmethod
+    def _marco(frame):
+        """Una entrada por función (línea de su def), no por línea en ejecución, para que las muestras se sumen"""
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+    def _bucle(self):
+        propio = threading.get_ident()
+        while not self._parar.wait(self.intervalo):
+            nombres = {t.ident: t.name for t in threading.enumerate()}
+            pilas = []
+            for ident, frame in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                marcos = []
+                while frame is not None:
+                    marcos.append(self._marco(frame))
+                    frame = frame.f_back
+                marcos.append(nombres.get(ident, str(ident)))
+                pilas.append(";".join(reversed(marcos)))
+            with self._lock:
+                self._pilas.update(pilas)
+                self._muestras += 1
+
+    def iniciar(self):
+        with self._lock:
+            self._pilas = Counter()
+            self._muestras = 0
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="Perfilador", daemon=True)
+        self._hilo.start()
+
+    def detener(self, ciclo, cuentas):
+        """Para el muestreo y escribe los informes etiquetados con el ciclo y las cuentas"""
+        self._parar.set()
+        if self._hilo:
+            self._hilo.join()
+        with self._lock:
+            pilas, muestras = self._pilas, self._muestras
+        os.makedirs(self.directorio, exist_ok=True)
+        base = os.path.join(self.directorio, f"ciclo_{ciclo}_{time.strftime('%Y%m%d_%H%M%S')}")
+        etiqueta = f"# ciclo={ciclo} muestras={muestras} intervalo={self.intervalo * 1000:.0f}ms cuentas={','.join(cuentas)}"
+
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            for pila, n in pilas.most_common():
+                f.write(f"{pila} {n}\n")
+
+        propio, total = Counter(), Counter()
+        for pila, n in pilas.items():
+            marcos = pila.split(";")[1:]
+            if not marcos:
+                continue
+            propio[marcos[-1]] += n
+            for marco in set(marcos):
+                total[marco] += n
+        with open(base + "_top.txt", "w", encoding="utf-8") as f:
+            f.write(etiqueta + "\n\n")
+            f.write(f"{'propio':>8} {'total':>8}  función\n")
+            for marco, n in propio.most_common(40):
+                f.write(f"{n:>8} {total[marco]:>8}  {marco}\n")
+        self.logger.info(f"Perfilador: {muestras} muestras del ciclo {ciclo} -> {base}.collapsed / {base}_top.txt")
+        return base
@@ -0,0 +1,213 @@
+# supervisor_chrome.py
+import os
+import time
+import threading
+import logging
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except Exception:
+    HAS_PSUTIL = False
+
+NOMBRES_CHROME = ("chrome", "chromedriver", "google-chrome", "chromium")
+
+
+class SupervisorChrome:
+    """
+    Sigue el árbol de procesos (chromedriver + chrome) de cada driver lanzado:
+    muestrea RSS/CPU, mata árboles que superan el presupuesto, elimina procesos
+    huérfanos que sobreviven a driver.quit() y acumula el coste por cuenta.
+    """
+
+    def __init__(self, max_rss_mb=1500, intervalo_s=30, gracia_quit_s=5):
+        self.logger = logging.getLogger("BotVisado")
+        self.max_rss = int(float(max_rss_mb) * 1024 * 1024)
+        self.intervalo_s = float(intervalo_s)
+        self.gracia_quit_s = float(gracia_quit_s)
+        self._lock = threading.Lock()
+        # pid raíz -> {"procs": {pid: Process}, "cuenta": ident, "cpu_marca": float}
+        self._arboles = {}
+        self._coste = {}  # ident -> {"cpu_s", "rss_pico_mb", "sesiones"}
+        self.stats = {"arboles": 0, "huerfanos_eliminados": 0, "fugas_tras_quit": 0, "excesos_memoria": 0}
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name="SupervisorChrome", daemon=True)
+        self._hilo.start()
+
+    # ---- registro ----
+    @staticmethod
+    def _pid_driver(driver):
+        service = getattr(driver, "service", None)
+        process = getattr(service, "process", None)
+        return getattr(process, "pid", None)
+
+    def _refrescar(self, arbol, raiz):
+        try:
+            for p in [raiz] + raiz.children(recursive=True):
+                arbol["procs"].setdefault(p.pid, p)
+        except psutil.Error:
+            pass
+
+    def registrar(self, driver, identificador):
+        pid = self._pid_driver(driver)
+        if pid is None:
+            return
+        try:
+            raiz = psutil.Process(pid)
+        except psutil.Error:
+            return
+        arbol = {"raiz": raiz, "procs": {}, "cuenta": identificador, "cpu_marca": 0.0}
+        self._refrescar(arbol, raiz)
+        with self._lock:
+            self._arboles[pid] = arbol
+            self.stats["arboles"] += 1
+            self._coste_de(identificador)["sesiones"] += 1
+
+    def _coste_de(self, identificador):
+        return self._coste.setdefault(identificador, {"cpu_s": 0.0, "rss_pico_mb": 0.0, "sesiones": 0})
+
+    def marcar_cuenta(self, driver, identificador):
+        """El driver pasa a trabajar para otra cuenta: cerrar la cuenta de CPU de la anterior"""
+        pid = self._pid_driver(driver)
+        with self._lock:
+            arbol = self._arboles.get(pid)
+            if not arbol:
+                return
+            self._imputar(arbol)
+            if arbol["cuenta"] != identificador:
+                arbol["cuenta"] = identificador
+                self._coste_de(identificador)["sesiones"] += 1
+
+    def liberar(self, driver):
+        """
+        Tras driver.quit(): espera hasta gracia_quit_s a que el árbol termine solo;
+        lo que siga vivo después se cuenta como fuga y se mata
+        """
+        pid = self._pid_driver(driver)
+        with self._lock:
+            arbol = self._arboles.pop(pid, None)
+        if not arbol:
+            return
+        with self._lock:
+            self._imputar(arbol)
+        vivos = [p for p in arbol["procs"].values() if self._vivo(p)]
+        if vivos and self.gracia_quit_s > 0:
+            _, vivos = psutil.wait_procs(vivos, timeout=self.gracia_quit_s)
+            vivos = [p for p in vivos if self._vivo(p)]
+        if vivos:
+            with self._lock:
+                self.stats["fugas_tras_quit"] += len(vivos)
+            self.logger.warning("Supervisor: %d procesos de Chrome sobrevivieron a quit(); eliminándolos", len(vivos))
+            self._matar(vivos)
+
+    # ---- muestreo ----
+    @staticmethod
+    def _vivo(p):
+        try:
+            return p.is_running() and p.status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+
+    def _medir(self, arbol):
+        rss, cpu = 0, 0.0
+        for p in list(arbol["procs"].values()):
+            try:
+                with p.oneshot():
+                    rss += p.memory_info().rss
+                    t = p.cpu_times()
+                    cpu += t.user + t.system
+            except psutil.Error:
+                continue
+        return rss, cpu
+
+    def _imputar(self, arbol):
+        """Asigna a la cuenta actual la CPU consumida desde la última marca (con self._lock tomado)"""
+        self._refrescar(arbol, arbol["raiz"])
+        rss, cpu = self._medir(arbol)
+        coste = self._coste_de(arbol["cuenta"])
+        coste["cpu_s"] += max(0.0, cpu - arbol["cpu_marca"])
+        coste["rss_pico_mb"] = max(coste["rss_pico_mb"], rss / 1024 / 1024)
+        arbol["cpu_marca"] = cpu
+        return rss
+
+    def muestrear(self):
+        excedidos = []
+        with self._lock:
+            for pid, arbol in list(self._arboles.items()):
+                rss = self._imputar(arbol)
+                if self.max_rss and rss > self.max_rss:
+                    excedidos.append((pid, arbol, rss))
+                    del self._arboles[pid]
+            self.stats["excesos_memoria"] += len(excedidos)
+        for pid, arbol, rss in excedidos:
+            self.logger.warning("Supervisor: Chrome de %s usa %.0f MB (> %.0f MB); se mata el árbol",
+                                arbol["cuenta"], rss / 1024 / 1024, self.max_rss / 1024 / 1024)
+            self._matar(list(arbol["procs"].values()))
+
+    @staticmethod
+    def _sin_chromedriver(p):
+        """
+        Chrome cuyo chromedriver ya no existe: ningún ancestro es un chromedriver vivo.
+        Un lanzamiento en curso (aún sin registrar) siempre cuelga de su chromedriver,
+        así que nunca se considera huérfano.
+        """
+        if p.name().lower().startswith("chromedriver"):
+            return False
+        for ancestro in p.parents():
+            try:
+                if ancestro.name().lower().startswith("chromedriver"):
+                    return False
+            except psutil.Error:
+                continue
+        return True
+
+    def barrer_huerfanos(self):
+        """Mata procesos Chrome descendientes de este proceso que han perdido su chromedriver"""
+        with self._lock:
+            for arbol in self._arboles.values():
+                self._refrescar(arbol, arbol["raiz"])
+            activos = {pid for arbol in self._arboles.values() for pid in arbol["procs"]}
+        huerfanos = []
+        try:
+            for p in psutil.Process(os.getpid()).children(recursive=True):
+                try:
+                    if (p.pid not in activos and p.name().lower().startswith(NOMBRES_CHROME)
+                            and self._sin_chromedriver(p)):
+                        huerfanos.append(p)
+                except psutil.Error:
+                    continue
+        except psutil.Error:
+            return 0
+        if huerfanos:
+            with self._lock:
+                self.stats["huerfanos_eliminados"] += len(huerfanos)
+            self.logger.warning("Supervisor: %d procesos Chrome huérfanos eliminados", len(huerfanos))
+            self._matar(huerfanos)
+        return len(huerfanos)
+
+    def _matar(self, procesos):
+        for p in procesos:
+            try:
+                p.kill()
+            except psutil.Error:
+                pass
+        # wait() también recoge los zombis cuando somos el padre (PID 1 en el contenedor)
+        psutil.wait_procs(procesos, timeout=5)
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo_s):
+            try:
+                self.muestrear()
+            except Exception as e:
+                self.logger.error("Supervisor: error muestreando procesos: %s", e)
+
+    def detener(self):
+        self._parar.set()
+
+    def resumen(self):
+        with self._lock:
+            s = dict(self.stats)
+            s["activos"] = len(self._arboles)
+            s["coste_por_cuenta"] = {k: {"cpu_s": round(v["cpu_s"], 1), "rss_pico_mb": round(v["rss_pico_mb"]), "sesiones": v["sesiones"]}
+                                     for k, v in self._coste.items()}
+            return s
@@ -0,0 +1,115 @@
+# webdriver_remoto.py
+import time
+import threading
+import logging
+
+import requests
+from selenium import webdriver
+
+
+class BalanceadorRemoto:
+    """
+    Reparte las sesiones de Chrome entre varios endpoints WebDriver remotos
+    (Selenium Grid / standalone): elige el nodo sano con menos sesiones activas,
+    comprueba /status periódicamente y pasa al siguiente si la creación falla.
+    Si todos los nodos están llenos, crear() espera hasta espera_hueco_s a que se
+    libere una sesión. Cada driver recuerda su balanceador (driver.balanceador_remoto)
+    para devolver el hueco al mismo aunque la config se haya recargado entretanto.
+    """
+
+    def __init__(self, endpoints, max_sesiones_por_nodo=4, intervalo_salud_s=30, espera_hueco_s=300):
+        self.logger = logging.getLogger("BotVisado")
+        if not endpoints:
+            raise ValueError("No hay endpoints WebDriver remotos configurados")
+        self.max_sesiones = int(max_sesiones_por_nodo)
+        self.intervalo_salud_s = float(intervalo_salud_s)
+        self.espera_hueco_s = float(espera_hueco_s)
+        self._lock = threading.Condition()  # también se notifica al liberar un hueco
+        self._nodos = {url.rstrip('/'): {"activas": 0, "sano": True, "revisado": 0.0, "fallos": 0} for url in endpoints}
+        self._sesiones = {}  # session_id -> url
+
+    def _revisar_salud(self, url, nodo):
+        """GET <url>/status; se considera sano si responde y no declara ready=false"""
+        try:
+            resp = requests.get(f"{url}/status", timeout=5)
+            sano = resp.status_code == 200 and resp.json().get("value", {}).get("ready", True) is not False
+        except Exception:
+            sano = False
+        if sano != nodo["sano"]:
+            self.logger.warning("WebDriver remoto %s: %s", url, "disponible" if sano else "NO disponible")
+        nodo["sano"] = sano
+        nodo["revisado"] = time.monotonic()
+
+    def _revisar_pendientes(self):
+        ahora = time.monotonic()
+        with self._lock:
+            pendientes = [(url, n) for url, n in self._nodos.items() if ahora - n["revisado"] >= self.intervalo_salud_s]
+        for url, nodo in pendientes:
+            self._revisar_salud(url, nodo)
+
+    def _reservar(self):
+        """Reserva un hueco en el nodo sano con menos sesiones activas (None si no hay)"""
+        with self._lock:
+            libres = [(n["activas"], url) for url, n in self._nodos.items()
+                      if n["sano"] and n["activas"] < self.max_sesiones]
+            if not libres:
+                return None
+            url = min(libres)[1]
+            self._nodos[url]["activas"] += 1
+            return url
+
+    def _esperar_hueco(self, limite):
+        """Espera a que se libere una sesión (o toque revisar la salud); False si se agotó el plazo"""
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            return False
+        with self._lock:
+            self._lock.wait(min(restante, self.intervalo_salud_s))
+        return True
+
+    def crear(self, options):
+        """
+        Abre una sesión Remote en el nodo menos cargado, con failover al resto;
+        si no hay hueco, espera hasta espera_hueco_s a que alguno se libere
+        """
+        limite = time.monotonic() + self.espera_hueco_s
+        while True:
+            driver = self._intentar_crear(options)
+            if driver is not None:
+                return driver
+            if not self._esperar_hueco(limite):
+                raise RuntimeError(f"No hay nodos WebDriver remotos sanos con capacidad libre tras {self.espera_hueco_s:.0f}s")
+
+    def _intentar_crear(self, options):
+        self._revisar_pendientes()
+        for _ in range(len(self._nodos)):
+            url = self._reservar()
+            if url is None:
+                return None
+            try:
+                driver = webdriver.Remote(command_executor=url, options=options)
+            except Exception as e:
+                self.logger.error("No se pudo crear sesión en %s: %s; probando el siguiente nodo", url, e)
+                with self._lock:
+                    nodo = self._nodos[url]
+                    nodo["activas"] -= 1
+                    nodo["sano"] = False
+                    nodo["revisado"] = time.monotonic()
+                    nodo["fallos"] += 1
+                continue
+            with self._lock:
+                self._sesiones[driver.session_id] = url
+            driver.balanceador_remoto = self
+            return driver
+        return None
+
+    def liberar(self, driver):
+        with self._lock:
+            url = self._sesiones.pop(getattr(driver, "session_id", None), None)
+            if url in self._nodos:
+                self._nodos[url]["activas"] = max(0, self._nodos[url]["activas"] - 1)
+                self._lock.notify()
+
+    def resumen(self):
+        with self._lock:
+            return {url: {"activas": n["activas"], "sano": n["sano"], "fallos": n["fallos"]} for url, n in self._nodos.items()}